@@ -1,55 +1,244 @@
-import base64
-import cloudpickle
-import json
+import itertools
 import os
 import socket
 import subprocess
 import sys
-import tempfile
-import time
+import threading
 
+from repl_box import _protocol
 from repl_box.context import Context
 from repl_box._notebook import prepare_variables
 
+# set()/reset() payloads above this spill to a shared-memory file rather
+# than crossing the socket (see Repl._send_variables).
+_SPILL_THRESHOLD = 1 << 16
+_SPILL_DIR = "/dev/shm"
+
 
 class Repl:
     def __init__(self, proc: subprocess.Popen, socket_path: str):
         self._proc = proc
         self._socket_path = socket_path
+        self._pool = None   # set by ReplPool while checked out
+        # One long-lived connection, created lazily on first request.
+        # Reconnecting per request would pay connect/close syscalls on
+        # every send — wasteful for chatty callers like Context._sync.
+        self._sock: socket.socket | None = None
+        self._reader: _protocol.FrameReader | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            sock_type = socket.SOCK_STREAM | getattr(socket, "SOCK_CLOEXEC", 0)
+            sock = socket.socket(socket.AF_UNIX, sock_type)
+            _protocol.configure_socket(sock)
+            sock.connect(_protocol.socket_address(self._socket_path))
+            self._sock = sock
+            self._reader = _protocol.FrameReader(sock)
+        return self._sock
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self._reader = None
+
+    def _request(self, opcode: int, *parts: bytes) -> tuple[int, bytes]:
+        with self._lock:
+            try:
+                sock = self._connect()
+                _protocol.send_frame(sock, opcode, *parts)
+                response = self._reader.recv_frame()
+            except (BrokenPipeError, ConnectionResetError):
+                # The cached connection went stale (e.g. the server was
+                # restarted on the same socket); reconnect and retry once.
+                self._disconnect()
+                sock = self._connect()
+                _protocol.send_frame(sock, opcode, *parts)
+                response = self._reader.recv_frame()
+        if response is None:
+            raise ConnectionError("repl-box server closed the connection")
+        return response
 
-    def _request(self, payload: dict) -> dict:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.connect(self._socket_path)
-        with sock, sock.makefile("rb") as f:
-            sock.sendall(json.dumps(payload).encode() + b"\n")
-            raw = f.readline()
-        return json.loads(raw)
+    def send(self, code: str, capture: bool = True) -> dict:
+        """Execute code on the server; the result dict carries stdout/stderr/error.
 
-    def send(self, code: str) -> dict:
-        return self._request({"code": code})
+        capture=False skips output capture and In/Out formatting — cheaper
+        for side-effect-only statements (assign, then get()), at the cost
+        of an empty stdout and no cell number.
+        """
+        request = {"code": code}
+        if not capture:
+            request["capture"] = False
+        _, payload = self._request(_protocol.OP_EXEC, _protocol.json_dumps(request))
+        return _protocol.json_loads(payload)
+
+    def eval_many(self, codes: list[str]) -> list[dict]:
+        """Execute several snippets in one round-trip; one result dict each."""
+        _, payload = self._request(
+            _protocol.OP_EXEC, _protocol.json_dumps({"evals": list(codes)})
+        )
+        return _protocol.json_loads(payload)["results"]
 
     def get(self, name: str):
         """Retrieve a named variable from the server's namespace as a live Python object."""
-        result = self._request({"get": name})
-        if result.get("error"):
-            raise NameError(result["error"])
-        return cloudpickle.loads(base64.b64decode(result["value"].encode()))
+        kind, payload = self._request(_protocol.OP_GET, name.encode())
+        if kind != _protocol.RESP_PICKLE:
+            raise NameError(_protocol.json_loads(payload)["error"])
+        return _protocol.unpack_pickle(payload)
 
-    def set(self, **variables) -> None:
-        payload = base64.b64encode(cloudpickle.dumps(prepare_variables(variables))).decode()
-        result = self._request({"set": payload})
+    def _command(self, opcode: int, *parts: bytes) -> None:
+        """Issue a request whose response is just a status dict; raise on error."""
+        _, response = self._request(opcode, *parts)
+        result = _protocol.json_loads(response)
         if result.get("error"):
             raise RuntimeError(result["error"])
 
+    def _send_variables(self, opcode: int, variables: dict) -> None:
+        """Ship a variables dict, spilling large pickles to shared memory.
+
+        Past the threshold the pickle is written to a /dev/shm file and
+        only the path crosses the socket — the server mmaps and unpickles
+        in place, so the payload bytes never transit the kernel socket
+        buffers. Small payloads stay inline, where a file would just add
+        syscalls.
+        """
+        parts = _protocol.pack_pickle(prepare_variables(variables))
+        if sum(len(p) for p in parts) > _SPILL_THRESHOLD and os.path.isdir(_SPILL_DIR):
+            import tempfile
+
+            fd, path = tempfile.mkstemp(prefix="repl-box-", suffix=".pkl", dir=_SPILL_DIR)
+            with os.fdopen(fd, "wb") as f:
+                f.writelines(parts)
+            self._command(
+                _protocol.OP_SET_FILE,
+                _protocol.json_dumps(
+                    {"path": path, "reset": opcode == _protocol.OP_RESET}
+                ),
+            )
+        else:
+            self._command(opcode, *parts)
+
+    def set(self, **variables) -> None:
+        self._send_variables(_protocol.OP_SET, variables)
+
+    def reset(self, **variables) -> None:
+        """Clear the server's namespace, replacing it with variables; In/Out numbering restarts."""
+        self._send_variables(_protocol.OP_RESET, variables)
+
+    def _list_append(self, name: str, item) -> None:
+        self._command(_protocol.OP_LIST_APPEND, *_protocol.pack_pickle((name, item)))
+
+    def _list_extend(self, name: str, items: list) -> None:
+        self._command(_protocol.OP_LIST_EXTEND, *_protocol.pack_pickle((name, items)))
+
+    def _list_op(self, name: str, method: str, *args) -> None:
+        self._command(_protocol.OP_LIST_OP, *_protocol.pack_pickle((name, method, args)))
+
     def context(self, name: str, initial=None) -> Context:
         """Create a Context bound to this server under the given variable name."""
         return Context(self, name, initial)
 
     def close(self) -> None:
+        if self._pool is not None:
+            self._pool._release(self)
+            return
+        self._disconnect()
         self._proc.terminate()
         self._proc.wait()
-        if os.path.exists(self._socket_path):
-            os.unlink(self._socket_path)
+        if not self._socket_path.startswith("@"):
+            try:
+                os.unlink(self._socket_path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_socket_seq = itertools.count()
+
+
+def _default_socket_path() -> str:
+    """Default socket for a new server, unique per start() call.
+
+    On Linux this is an abstract-namespace name ("@..."), which skips the
+    filesystem entirely — no inode lookup per connect, nothing to unlink.
+    """
+    if sys.platform == "linux":
+        return f"@repl-box-{os.getpid()}-{next(_socket_seq)}"
+    return "/tmp/repl-box.sock"
+
+
+class InprocRepl:
+    """A Repl that executes in the current process — no subprocess, no socket.
+
+    For callers that don't need OS isolation (tests, notebooks), the
+    subprocess spawn and per-request IPC of a real server are pure
+    overhead. Here send() runs execute() directly against a local
+    namespace and set() is a dict update — no pickling at all. The API
+    and return shapes match Repl, so Context and downstream code work
+    unchanged.
+    """
+
+    def __init__(self, **variables):
+        self._namespace: dict = dict(variables)
+        self._counter = 1
+
+    def send(self, code: str, capture: bool = True) -> dict:
+        from repl_box.server import execute, execute_silent
+
+        if not capture:
+            return execute_silent(code, self._namespace)
+        result = execute(code, self._namespace, self._counter)
+        self._counter += 1
+        return result
+
+    def eval_many(self, codes: list[str]) -> list[dict]:
+        """Execute several snippets back-to-back; one result dict each."""
+        return [self.send(code) for code in codes]
+
+    def get(self, name: str):
+        """Retrieve a named variable — the live object itself, no copy."""
+        if name not in self._namespace:
+            raise NameError(f"NameError: name '{name}' is not defined")
+        return self._namespace[name]
+
+    def set(self, **variables) -> None:
+        self._namespace.update(variables)
+
+    def reset(self, **variables) -> None:
+        self._namespace.clear()
+        self._namespace.update(variables)
+        self._counter = 1
+
+    def _list_append(self, name: str, item) -> None:
+        try:
+            self._namespace[name].append(item)
+        except KeyError as e:
+            raise RuntimeError(f"KeyError: {e}") from e
+
+    def _list_extend(self, name: str, items: list) -> None:
+        try:
+            self._namespace[name].extend(items)
+        except KeyError as e:
+            raise RuntimeError(f"KeyError: {e}") from e
+
+    def _list_op(self, name: str, method: str, *args) -> None:
+        try:
+            getattr(self._namespace[name], method)(*args)
+        except KeyError as e:
+            raise RuntimeError(f"KeyError: {e}") from e
+
+    def context(self, name: str, initial=None) -> Context:
+        """Create a Context bound to this namespace under the given variable name."""
+        return Context(self, name, initial)
+
+    def close(self) -> None:
+        pass
 
     def __enter__(self):
         return self
@@ -61,42 +250,73 @@ class Repl:
 def start(
     socket_path: str | None = None,
     timeout: float = 5.0,
+    inproc: bool = False,
     **variables,
-) -> Repl:
+) -> Repl | InprocRepl:
     """Start the repl-box server in the background. Returns a Repl instance.
 
     Any keyword arguments are pickled and pre-loaded into the server's namespace:
         repl = repl_box.start(df=my_dataframe, model=my_model)
         repl.send("print(df.shape)")
+
+    With inproc=True, no subprocess is spawned: code runs in this process
+    against a plain namespace dict. Same API, none of the isolation — and
+    none of the startup or serialization cost.
     """
-    env = os.environ.copy()
-    resolved = socket_path or env.get("REPL_BOX_SOCKET", "/tmp/repl-box.sock")
+    if inproc:
+        return InprocRepl(**variables)
+
+    import select
+    import tempfile
 
-    if socket_path:
-        env["REPL_BOX_SOCKET"] = socket_path
+    env = os.environ.copy()
+    resolved = socket_path or env.get("REPL_BOX_SOCKET") or _default_socket_path()
+    env["REPL_BOX_SOCKET"] = resolved
 
     if variables:
         tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pkl")
-        cloudpickle.dump(prepare_variables(variables), tmp)
+        for part in _protocol.pack_pickle(prepare_variables(variables)):
+            tmp.write(part)
         tmp.close()
         env["REPL_BOX_INIT"] = tmp.name
 
-    # Remove any leftover socket so the wait loop below always waits for
-    # the new server rather than returning immediately against an old one.
-    if os.path.exists(resolved):
-        os.unlink(resolved)
+    # The server signals readiness over a pipe the moment it is listening,
+    # so there is no poll-and-sleep dead time — and no race against a
+    # leftover socket file from an earlier server on the same path.
+    read_fd, write_fd = os.pipe()
+    env["REPL_BOX_READY_FD"] = str(write_fd)
 
+    # No stderr=PIPE: nothing reads it, so piping would only buffer the
+    # server's diagnostics until the pipe fills. Inheriting stderr keeps
+    # them visible and the stdio setup trivial.
     proc = subprocess.Popen(
         [sys.executable, "-m", "repl_box.server"],
         env=env,
-        stderr=subprocess.PIPE,
+        pass_fds=(write_fd,),
     )
+    os.close(write_fd)
 
-    deadline = time.monotonic() + timeout
-    while not os.path.exists(resolved):
-        if time.monotonic() > deadline:
+    try:
+        ready, _, _ = select.select([read_fd], [], [], timeout)
+        # An empty read means the server died before it could listen.
+        if not ready or not os.read(read_fd, 2):
             proc.kill()
             raise RuntimeError(f"repl-box server did not start within {timeout}s")
-        time.sleep(0.05)
+    finally:
+        os.close(read_fd)
 
     return Repl(proc, resolved)
+
+
+def pool(size: int = 4):
+    """Pre-start size idle servers; the pool's start() hands one out per call.
+
+    Amortizes interpreter launch across many start/close cycles:
+
+        with repl_box.pool(size=4) as p:
+            with p.start(df=df) as repl:
+                repl.send("print(df.shape)")
+    """
+    from repl_box._pool import ReplPool
+
+    return ReplPool(size)
@@ -4,6 +4,8 @@ In Jupyter/Colab, every function defined in a cell has __globals__ pointing
 at the kernel namespace, which contains ZMQ socket references that cloudpickle
 cannot serialize. This module detects that environment and strips those globals.
 """
+import functools
+import re
 import types
 
 _IPYTHON_INJECTED = frozenset({
@@ -15,31 +17,96 @@ _IPYTHON_INJECTED = frozenset({
     '_ih', '_oh', '_dh',
 })
 
+_NUMBERED_INPUT_RE = re.compile(r'_i\d+$')   # _i1, _i2, ...
+
+
+@functools.lru_cache(maxsize=1024)
+def _is_ipython_type(t: type) -> bool:
+    """Memoized per type: the __module__ walk runs once, not once per global."""
+    module = getattr(t, '__module__', '') or ''
+    return module.startswith(('zmq.', 'ipykernel.', 'IPython.'))
+
 
 def _is_notebook_global(k: str, v) -> bool:
     """Return True if this global was injected by IPython/Jupyter."""
-    if k in _IPYTHON_INJECTED:
+    if k in _IPYTHON_INJECTED or _NUMBERED_INPUT_RE.match(k):
         return True
-    if k.startswith('_i') and k[2:].isdigit():   # _i1, _i2, ...
+    return _is_ipython_type(type(v))
+
+
+# Scalar types that always pickle — skip the probe entirely. Containers
+# are deliberately absent: a list can hold a ZMQ socket.
+_SAFE_TYPES = (int, float, complex, bool, str, bytes, type(None))
+
+# Types from these top-level modules wrap OS resources that never pickle;
+# drop them without paying to serialize anything. Matched against the
+# first dotted component of __module__, so 'socket' catches socket and
+# socket.* but not an unrelated 'socket_utils'.
+_UNSAFE_MODULES = frozenset({
+    'zmq', 'ipykernel', 'IPython',
+    'sqlite3', '_thread', 'socket', 'ssl', 'tornado',
+})
+
+
+def _probe_picklable(v, probe_cache: dict) -> bool:
+    """Serializability probe, memoized by id(v) within one cleaning pass.
+
+    All cell-defined functions share the notebook's globals dict, so
+    without the cache every function cleaned would re-pickle the entire
+    namespace — models and dataframes included. id() keys are only safe
+    while the values are alive, which the caller's globals guarantee for
+    the duration of a pass.
+    """
+    import pickle as _pickle
+
+    if isinstance(v, _SAFE_TYPES):
         return True
     module = getattr(type(v), '__module__', '') or ''
-    return module.startswith(('zmq.', 'ipykernel.', 'IPython.'))
+    if module.partition('.')[0] in _UNSAFE_MODULES:
+        return False
+
+    ok = probe_cache.get(id(v))
+    if ok is None:
+        try:
+            _pickle.dumps(v)   # fast C pickler handles most values
+            ok = True
+        except Exception:
+            import cloudpickle as _cp
+            try:
+                _cp.dumps(v)
+                ok = True
+            except Exception:
+                ok = False
+        probe_cache[id(v)] = ok
+    return ok
+
+
+def _referenced_names(code) -> set:
+    """Global names a code object can reach, including nested functions."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _referenced_names(const)
+    return names
 
 
-def clean_for_notebook(fn, _cache=None):
+def clean_for_notebook(fn, _cache=None, _probe_cache=None):
     """Return a copy of fn with unpicklable notebook globals stripped.
 
     Outside a notebook (no get_ipython in globals), fn is returned unchanged.
 
     Strategy:
+    - Only globals named in fn's code (co_names, plus nested code objects)
+      are considered — a live kernel namespace can hold thousands of
+      entries the function never touches
     - Named denylist for known IPython/ZMQ types (fast)
     - Recursive cleaning for other notebook-defined functions (so A can call B)
-    - try-except cloudpickle probe for everything else (robust)
+    - try-except pickle probe for everything else (robust), memoized per value
 
-    _cache maps id(fn) -> cleaned_fn to break circular references.
+    _cache maps id(fn) -> cleaned_fn to break circular references;
+    _probe_cache memoizes probe results so values shared across functions
+    are only pickled once.
     """
-    import cloudpickle as _cp
-
     if not callable(fn) or not hasattr(fn, '__globals__'):
         return fn
     if 'get_ipython' not in fn.__globals__:
@@ -47,6 +114,8 @@ def clean_for_notebook(fn, _cache=None):
 
     if _cache is None:
         _cache = {}
+    if _probe_cache is None:
+        _probe_cache = {}
 
     fn_id = id(fn)
     if fn_id in _cache:
@@ -64,22 +133,57 @@ def clean_for_notebook(fn, _cache=None):
     )
     _cache[fn_id] = new_fn  # register before recursing
 
-    for k, v in fn.__globals__.items():
+    source_globals = fn.__globals__
+    for k in _referenced_names(fn.__code__):
+        if k not in source_globals:
+            continue   # builtin, or resolved elsewhere at call time
+        v = source_globals[k]
         if _is_notebook_global(k, v):
             continue
         if callable(v) and hasattr(v, '__globals__') and 'get_ipython' in v.__globals__:
             # Another notebook function: clean recursively instead of probing
-            clean[k] = clean_for_notebook(v, _cache)
-        else:
-            try:
-                _cp.dumps(v)
-                clean[k] = v
-            except Exception:
-                pass  # drop anything cloudpickle can't handle
+            clean[k] = clean_for_notebook(v, _cache, _probe_cache)
+        elif _probe_picklable(v, _probe_cache):
+            clean[k] = v
+        # drop anything that can't be pickled
 
     return new_fn
 
 
+def _strip_pydantic_frame(v):
+    """Drop the caller-frame snapshot pydantic keeps on locally defined models.
+
+    A model class defined inside a function carries the enclosing frame's
+    locals in __pydantic_parent_namespace__ — including whatever unpicklable
+    objects (locks, sockets, the Repl itself) happened to be in scope. The
+    snapshot only serves deferred annotation resolution (model_rebuild), so
+    a fully built model loses nothing by shedding it. Functions are walked
+    through their closure cells, where locally defined models usually hide.
+    """
+    if isinstance(v, type):
+        if getattr(v, '__pydantic_parent_namespace__', None):
+            v.__pydantic_parent_namespace__ = None
+    elif callable(v):
+        for cell in getattr(v, '__closure__', None) or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:   # empty cell
+                continue
+            if isinstance(contents, type) and getattr(contents, '__pydantic_parent_namespace__', None):
+                contents.__pydantic_parent_namespace__ = None
+    return v
+
+
 def prepare_variables(variables: dict) -> dict:
-    """Apply notebook global cleaning to any callables in a variables dict."""
-    return {k: clean_for_notebook(v) for k, v in variables.items()}
+    """Apply notebook global cleaning to any callables in a variables dict.
+
+    One function cache and one probe cache span the whole dict, so
+    functions sharing the same notebook globals don't redo each other's
+    work.
+    """
+    cache: dict = {}
+    probe_cache: dict = {}
+    return {
+        k: clean_for_notebook(_strip_pydantic_frame(v), cache, probe_cache)
+        for k, v in variables.items()
+    }
@@ -0,0 +1,71 @@
+"""A pool of pre-started repl-box servers.
+
+Every start() pays a fresh Python interpreter launch — hundreds of
+milliseconds once heavy imports are involved. A pool spawns its servers
+once up front; checking one out costs a single reset round-trip, and
+closing a checked-out Repl resets its namespace and returns it to the
+pool instead of terminating the process.
+"""
+import threading
+
+
+class ReplPool:
+    """Hands out idle servers via start(); create one with repl_box.pool().
+
+        with repl_box.pool(size=4) as pool:
+            with pool.start(df=my_dataframe) as repl:
+                repl.send("print(df.shape)")
+            # repl is reset and back in the pool here
+    """
+
+    def __init__(self, size: int = 4):
+        import repl_box
+
+        self._lock = threading.Lock()
+        self._idle = [repl_box.start() for _ in range(size)]
+        self._closed = False
+
+    def start(self, **variables):
+        """Check out an idle server preloaded with variables.
+
+        If the pool is exhausted, a fresh (unpooled) server is started
+        rather than blocking the caller.
+        """
+        import repl_box
+
+        with self._lock:
+            repl = self._idle.pop() if self._idle else None
+        if repl is None:
+            return repl_box.start(**variables)
+        repl.reset(**variables)
+        repl._pool = self
+        return repl
+
+    def _release(self, repl) -> None:
+        repl._pool = None
+        try:
+            repl.reset()
+        except Exception:
+            repl.close()   # server is wedged; let it die rather than re-pool it
+            return
+        with self._lock:
+            if self._closed:
+                pooled = False
+            else:
+                self._idle.append(repl)
+                pooled = True
+        if not pooled:
+            repl.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for repl in idle:
+            repl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -8,21 +8,56 @@ Usage:
     echo "print(x)" | uv run client.py -
 """
 
-import json
 import os
 import socket
 import sys
 
+from repl_box import _protocol
+
 SOCKET_PATH = os.environ.get("REPL_BOX_SOCKET", "/tmp/repl-box.sock")
 
+# One connection per socket path, reused across send() calls — callers
+# importing this module in a loop shouldn't pay connect/close per RPC.
+_conn_cache: dict[str, tuple[socket.socket, "_protocol.FrameReader"]] = {}
+
+
+def _connect(socket_path: str) -> tuple[socket.socket, "_protocol.FrameReader"]:
+    sock_type = socket.SOCK_STREAM | getattr(socket, "SOCK_CLOEXEC", 0)
+    sock = socket.socket(socket.AF_UNIX, sock_type)
+    _protocol.configure_socket(sock)
+    sock.connect(_protocol.socket_address(socket_path))
+    conn = (sock, _protocol.FrameReader(sock))
+    _conn_cache[socket_path] = conn
+    return conn
+
+
+def _request(payload: dict, socket_path: str) -> dict:
+    conn = _conn_cache.get(socket_path)
+    if conn is None:
+        conn = _connect(socket_path)
+    sock, reader = conn
+    try:
+        _protocol.send_json(sock, _protocol.OP_EXEC, payload)
+        response = reader.recv_frame()
+    except (BrokenPipeError, ConnectionResetError):
+        # Stale cached connection (server restarted); reconnect and retry once.
+        sock.close()
+        _conn_cache.pop(socket_path, None)
+        sock, reader = _connect(socket_path)
+        _protocol.send_json(sock, _protocol.OP_EXEC, payload)
+        response = reader.recv_frame()
+    if response is None:
+        raise ConnectionError("repl-box server closed the connection")
+    return _protocol.json_loads(response[1])
+
 
 def send(code: str, socket_path: str = SOCKET_PATH) -> dict:
-    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    sock.connect(socket_path)
-    with sock, sock.makefile("rb") as f:
-        sock.sendall(json.dumps({"code": code}).encode() + b"\n")
-        raw = f.readline()
-    return json.loads(raw)
+    return _request({"code": code}, socket_path)
+
+
+def send_batch(codes: list[str], socket_path: str = SOCKET_PATH) -> list[dict]:
+    """Execute several snippets in one round-trip; one result dict each."""
+    return _request({"evals": list(codes)}, socket_path)["results"]
 
 
 def main() -> None:
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -22,74 +23,157 @@ class Context(list):
             client.responses.create(input=inputs, ...)
     """
 
+    # list subclasses may use __slots__: no per-instance __dict__, just
+    # three fixed slots alongside the list storage.
+    __slots__ = ("_repl", "_name", "_suspend")
+
     def __init__(self, repl: "Repl", name: str, initial=None):
         super().__init__(initial or [])
         self._repl = repl
         self._name = name
+        self._suspend = 0
         self._sync()
 
+    # TypeAdapter cache keyed by model type, shared by all Contexts.
+    _adapters: dict = {}
+
+    @classmethod
+    def _coerce_many(cls, items) -> list:
+        """Coerce a batch of items, walking the pydantic schema once per list.
+
+        model_dump() re-walks the model schema on every call. When a batch
+        shares one model type — the `inputs += resp.output` pattern — a
+        cached TypeAdapter dumps the whole list in a single schema pass.
+        """
+        items = list(items)
+        first = type(items[0]) if items else None
+        if (
+            first is not None
+            and hasattr(items[0], "model_dump")
+            and all(type(i) is first for i in items)
+        ):
+            try:
+                from pydantic import TypeAdapter
+            except ImportError:
+                pass
+            else:
+                adapter = cls._adapters.get(first)
+                if adapter is None:
+                    adapter = TypeAdapter(list[first])
+                    cls._adapters[first] = adapter
+                return adapter.dump_python(items, mode="json", exclude_none=True)
+        return [cls._coerce(i) for i in items]
+
     @staticmethod
     def _coerce(item):
-        """Coerce pydantic models to plain dicts via model_dump(exclude_none=True).
-
-        Excluding None fields is necessary because OpenAI rejects unknown/null
-        parameters (e.g. status=None on a reasoning item) when items are passed
-        back as input to a subsequent API call.
+        """Coerce pydantic models to plain dicts via model_dump(mode="json").
+
+        Coercion happens exactly once, at insertion — reads and json.dumps(ctx)
+        never re-walk the model. mode="json" renders nested values (datetimes,
+        enums) as JSON-native types so serialization later is a plain dict
+        dump. Excluding None fields is necessary because OpenAI rejects
+        unknown/null parameters (e.g. status=None on a reasoning item) when
+        items are passed back as input to a subsequent API call.
         """
         if hasattr(item, "model_dump"):
-            return item.model_dump(exclude_none=True)
+            return item.model_dump(mode="json", exclude_none=True)
         return item
 
     def _sync(self):
+        if self._suspend:
+            return
         self._repl.set(**{self._name: list(self)})
 
+    @contextmanager
+    def batch(self):
+        """Suppress per-mutation syncing; one sync fires when the block exits.
+
+        Each mutation normally re-sends the whole list to the server, so a
+        tight loop of appends pays one round-trip per item. Use batch() to
+        coalesce them:
+
+            with ctx.batch():
+                for item in items:
+                    ctx.append(item)
+        """
+        self._suspend += 1
+        try:
+            yield self
+        finally:
+            self._suspend -= 1
+            self._sync()
+
     def append(self, item):
-        super().append(self._coerce(item))
-        self._sync()
+        item = self._coerce(item)
+        super().append(item)
+        if self._suspend:
+            return
+        try:
+            self._repl._list_append(self._name, item)
+        except RuntimeError:
+            # e.g. the name was deleted server-side; fall back to a full sync
+            self._sync()
 
     def extend(self, items):
-        super().extend(self._coerce(i) for i in items)
-        self._sync()
+        items = self._coerce_many(items)
+        super().extend(items)
+        if self._suspend:
+            return
+        try:
+            self._repl._list_extend(self._name, items)
+        except RuntimeError:
+            self._sync()
+
+    def _delta(self, method, *args):
+        """Replay one mutation server-side instead of re-sending the list."""
+        if self._suspend:
+            return
+        try:
+            self._repl._list_op(self._name, method, *args)
+        except RuntimeError:
+            self._sync()
 
     def insert(self, index, item):
-        super().insert(index, self._coerce(item))
-        self._sync()
+        item = self._coerce(item)
+        super().insert(index, item)
+        self._delta("insert", index, item)
 
     def remove(self, item):
         super().remove(item)
-        self._sync()
+        self._delta("remove", item)
 
     def pop(self, index=-1):
         item = super().pop(index)
-        self._sync()
+        self._delta("pop", index)
         return item
 
     def clear(self):
         super().clear()
-        self._sync()
+        self._delta("clear")
 
     def sort(self, *, key=None, reverse=False):
+        # key callables don't replay reliably server-side; send the result.
         super().sort(key=key, reverse=reverse)
         self._sync()
 
     def reverse(self):
         super().reverse()
-        self._sync()
+        self._delta("reverse")
 
     def __setitem__(self, index, value):
-        super().__setitem__(index, self._coerce(value))
-        self._sync()
+        value = self._coerce(value)
+        super().__setitem__(index, value)
+        self._delta("__setitem__", index, value)
 
     def __delitem__(self, index):
         super().__delitem__(index)
-        self._sync()
+        self._delta("__delitem__", index)
 
     def __iadd__(self, other):
-        super().extend(self._coerce(i) for i in other)
-        self._sync()
+        self.extend(other)
         return self
 
     def __imul__(self, n):
         super().__imul__(n)
-        self._sync()
+        self._delta("__imul__", n)
         return self
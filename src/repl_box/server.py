@@ -2,19 +2,23 @@
 """
 repl-box server: a stateful Python REPL over a Unix domain socket.
 
-Each connection sends one JSON request {"code": "..."} and receives
-one JSON response {"stdout": "...", "stderr": "...", "error": "..."}.
+Requests are length-prefixed JSON frames (see repl_box._protocol); a
+connection may send any number of requests and receives one JSON
+response {"stdout": "...", "stderr": "...", "error": "..."} per request.
 State (variables, imports, definitions) persists across connections.
 """
 
-import io
-import json
+import ast
 import os
+import re
 import signal
 import socket
 import sys
+import threading
 import traceback
-from contextlib import redirect_stderr, redirect_stdout
+from functools import lru_cache
+
+from repl_box import _protocol
 
 SOCKET_PATH = os.environ.get("REPL_BOX_SOCKET", "/tmp/repl-box.sock")
 
@@ -26,25 +30,137 @@ def _format_input(code: str, n: int) -> str:
     return header + continuation
 
 
+@lru_cache(maxsize=1024)
+def _compile(code: str) -> tuple[str, object]:
+    """Compile code as an expression if possible, else as statements.
+
+    Parses once with ast and inspects the tree rather than trying an eval
+    compile and catching SyntaxError — raising an exception per statement
+    request costs far more than this branch. Cached so agent loops that
+    resend the same snippet (retries, tool-call harnesses) skip the parser
+    and compiler entirely.
+    """
+    tree = ast.parse(code, "<repl>", mode="exec")
+    if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+        return "eval", compile(ast.Expression(tree.body[0].value), "<repl>", "eval")
+    return "exec", compile(tree, "<repl>", "exec")
+
+
+# Marks the end of one capture in the pipe stream. NUL-framed so real
+# program output can't plausibly contain it.
+_CAPTURE_END = b"\x00repl-box:capture-end\x00"
+
+
+class _FdCapture:
+    """Capture writes to a stdio fd through an os.pipe.
+
+    redirect_stdout(StringIO) only sees Python-level writes and pays a
+    Python method dispatch per write() — slow for code that prints
+    heavily, and blind to C-level output entirely. Swapping the fd itself
+    sends print() and native writes alike into a kernel pipe buffer,
+    drained by a reader thread.
+    """
+
+    def __init__(self, fd: int):
+        self._fd = fd
+        self._chunks: list[bytes] = []
+
+    def __enter__(self):
+        read_fd, write_fd = os.pipe()
+        self._saved = os.dup(self._fd)
+        os.dup2(write_fd, self._fd)
+        # Kept open so __exit__ can write the end-of-capture sentinel.
+        self._write_fd = write_fd
+
+        def drain():
+            # Stop at the sentinel, not at EOF: a child process spawned by
+            # the user's code inherits the dup2'd pipe as its stdout/stderr
+            # and holds the write end open for its own lifetime, so EOF
+            # might never come (and would stall the request — and the
+            # namespace lock — until the child exits).
+            pending = b""
+            while True:
+                chunk = os.read(read_fd, 65536)
+                if not chunk:
+                    self._chunks.append(pending)
+                    break
+                pending += chunk
+                end = pending.find(_CAPTURE_END)
+                if end != -1:
+                    self._chunks.append(pending[:end])
+                    break
+                # Flush all but a tail long enough to catch a sentinel
+                # split across reads.
+                keep = len(_CAPTURE_END) - 1
+                if len(pending) > keep:
+                    self._chunks.append(pending[:-keep])
+                    pending = pending[-keep:]
+            os.close(read_fd)
+
+        self._thread = threading.Thread(target=drain)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        os.dup2(self._saved, self._fd)
+        os.close(self._saved)
+        # The drain thread is always reading, so this can't block even
+        # with a full pipe; anything a lingering child writes after the
+        # sentinel is discarded with the pipe.
+        os.write(self._write_fd, _CAPTURE_END)
+        os.close(self._write_fd)
+        self._thread.join()
+
+    def text(self) -> str:
+        return b"".join(self._chunks).decode(errors="replace")
+
+
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+
 def execute(code: str, namespace: dict, counter: int) -> dict:
-    stdout_buf = io.StringIO()
-    stderr_buf = io.StringIO()
+    # Bare-name inspection ("df", "result") is common enough in agent
+    # loops to deserve a fast path: a dict lookup and a repr, skipping
+    # compile, eval, and both fd-capture pipes. Names not in the
+    # namespace (including builtins and keywords) fall through to the
+    # full path, which keeps error and edge-case handling in one place.
+    if _IDENTIFIER.fullmatch(code) and code in namespace:
+        try:
+            value = namespace[code]
+            stdout = _format_input(code, counter)
+            if value is not None:
+                stdout += f"Out[{counter}]: {value!r}\n"
+            return {"stdout": stdout, "stderr": "", "error": None}
+        except Exception:
+            pass   # a hostile __repr__; take the slow path's capture/format
+
     error = None
     out_repr = None
 
-    try:
-        with redirect_stdout(stdout_buf), redirect_stderr(stderr_buf):
-            try:
-                result = eval(compile(code, "<repl>", "eval"), namespace)
+    # Flush anything already buffered so it isn't misattributed to the
+    # user's code, and flush again before the captures are restored so
+    # buffered prints land in the pipes.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    out_capture = _FdCapture(1)
+    err_capture = _FdCapture(2)
+    with out_capture, err_capture:
+        try:
+            mode, code_obj = _compile(code)
+            if mode == "eval":
+                result = eval(code_obj, namespace)
                 if result is not None:
                     out_repr = repr(result)
-            except SyntaxError:
-                exec(compile(code, "<repl>", "exec"), namespace)
-    except Exception:
-        error = traceback.format_exc().strip()
+            else:
+                exec(code_obj, namespace)
+        except Exception:
+            error = traceback.format_exc().strip()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
 
     stdout = _format_input(code, counter)
-    raw = stdout_buf.getvalue()
+    raw = out_capture.text()
     if raw:
         stdout += raw
         if not raw.endswith("\n"):
@@ -54,104 +170,239 @@ def execute(code: str, namespace: dict, counter: int) -> dict:
 
     return {
         "stdout": stdout,
-        "stderr": stderr_buf.getvalue(),
+        "stderr": err_capture.text(),
         "error": error,
     }
 
 
-def handle(conn: socket.socket, namespace: dict, counter: list[int]) -> None:
-    with conn:
-        data = b""
-        while b"\n" not in data:
-            chunk = conn.recv(4096)
-            if not chunk:
-                break
-            data += chunk
-
-        raw = data.split(b"\n")[0]
-        if not raw:
-            return
+def execute_silent(code: str, namespace: dict) -> dict:
+    """Run code without output capture or In/Out formatting.
 
-        try:
-            request = json.loads(raw)
-        except json.JSONDecodeError as e:
-            response = {"stdout": "", "stderr": "", "error": f"Bad request: {e}"}
+    For callers that only care about the side effect (assign, then
+    get()), the fd-capture pipes and repr formatting of execute() are
+    pure overhead. No cell number is consumed — like IPython's
+    silent=True, a silent exec doesn't appear in the In/Out history.
+    """
+    try:
+        mode, code_obj = _compile(code)
+        if mode == "eval":
+            eval(code_obj, namespace)
         else:
-            if "set" in request:
-                import base64
-                import cloudpickle
+            exec(code_obj, namespace)
+        error = None
+    except Exception:
+        error = traceback.format_exc().strip()
+    return {"stdout": "", "stderr": "", "error": error}
+
+
+def handle(conn: socket.socket, namespace: dict, counter: list[int],
+           lock: threading.Lock) -> None:
+    # Runs in its own thread, one per connection. Frame parsing and pickle
+    # decoding happen here, concurrently across connections; only namespace
+    # access and exec are serialized under the lock (one interpreter, one
+    # coherent REPL state).
+    with conn:
+        reader = _protocol.FrameReader(conn)
+        while True:
+            frame = reader.recv_frame()
+            if frame is None:
+                return
+            opcode, raw = frame
+
+            if opcode in (_protocol.OP_SET, _protocol.OP_RESET):
+                try:
+                    updates = _protocol.unpack_pickle(raw)
+                    with lock:
+                        if opcode == _protocol.OP_RESET:
+                            namespace.clear()
+                            counter[0] = 1
+                        namespace.update(updates)
+                    response = {"stdout": "", "stderr": "", "error": None}
+                except Exception:
+                    import traceback as tb
+                    response = {"stdout": "", "stderr": "", "error": tb.format_exc().strip()}
+            elif opcode in (_protocol.OP_LIST_APPEND, _protocol.OP_LIST_EXTEND):
+                try:
+                    name, value = _protocol.unpack_pickle(raw)
+                    with lock:
+                        if opcode == _protocol.OP_LIST_APPEND:
+                            namespace[name].append(value)
+                        else:
+                            namespace[name].extend(value)
+                    response = {"stdout": "", "stderr": "", "error": None}
+                except Exception:
+                    import traceback as tb
+                    response = {"stdout": "", "stderr": "", "error": tb.format_exc().strip()}
+            elif opcode == _protocol.OP_SET_FILE:
+                # Large set()/reset() payloads arrive spilled to a shared-
+                # memory file; only the path crosses the socket.
+                try:
+                    request = _protocol.json_loads(raw)
+                    updates = load_pickle_file(request["path"])
+                    with lock:
+                        if request.get("reset"):
+                            namespace.clear()
+                            counter[0] = 1
+                        namespace.update(updates)
+                    response = {"stdout": "", "stderr": "", "error": None}
+                except Exception:
+                    import traceback as tb
+                    response = {"stdout": "", "stderr": "", "error": tb.format_exc().strip()}
+            elif opcode == _protocol.OP_LIST_OP:
+                # Replay an arbitrary list mutation (insert, pop, __setitem__,
+                # ...) against the named variable, mirroring what the client
+                # applied locally — a few pickled args instead of the whole
+                # list re-sent per mutation.
                 try:
-                    updates = cloudpickle.loads(base64.b64decode(request["set"]))
-                    namespace.update(updates)
+                    name, method, args = _protocol.unpack_pickle(raw)
+                    with lock:
+                        getattr(namespace[name], method)(*args)
                     response = {"stdout": "", "stderr": "", "error": None}
                 except Exception:
                     import traceback as tb
                     response = {"stdout": "", "stderr": "", "error": tb.format_exc().strip()}
-            elif "get" in request:
-                import base64
-                import cloudpickle
+            elif opcode == _protocol.OP_GET:
                 import traceback as tb
-                var_name = request["get"]
-                if var_name not in namespace:
-                    response = {"stdout": "", "stderr": "", "error": f"NameError: name '{var_name}' is not defined", "value": None}
+                try:
+                    var_name = raw.decode()
+                    with lock:
+                        if var_name not in namespace:
+                            response = {"stdout": "", "stderr": "", "error": f"NameError: name '{var_name}' is not defined"}
+                        else:
+                            parts = _protocol.pack_pickle(namespace[var_name])
+                            response = None
+                    if response is None:
+                        _protocol.send_frame(conn, _protocol.RESP_PICKLE, *parts)
+                        continue
+                except UnicodeDecodeError as e:
+                    response = {"stdout": "", "stderr": "", "error": f"Bad request: variable name is not UTF-8: {e}"}
+                except Exception:
+                    response = {"stdout": "", "stderr": "", "error": tb.format_exc().strip()}
+            elif opcode == _protocol.OP_EXEC:
+                try:
+                    request = _protocol.json_loads(raw)
+                except ValueError as e:
+                    response = {"stdout": "", "stderr": "", "error": f"Bad request: {e}"}
                 else:
-                    try:
-                        encoded = base64.b64encode(cloudpickle.dumps(namespace[var_name])).decode()
-                        response = {"stdout": "", "stderr": "", "error": None, "value": encoded}
-                    except Exception:
-                        response = {"stdout": "", "stderr": "", "error": tb.format_exc().strip(), "value": None}
-            elif "code" in request:
-                response = execute(request["code"], namespace, counter[0])
-                counter[0] += 1
+                    # Validate the shape before dispatching: this is a
+                    # documented any-language protocol, and a malformed
+                    # payload should get a Bad-request response, not an
+                    # unhandled exception that drops the connection.
+                    has_code = isinstance(request, dict) and isinstance(
+                        request.get("code"), str
+                    )
+                    has_evals = (
+                        isinstance(request, dict)
+                        and isinstance(request.get("evals"), list)
+                        and all(isinstance(code, str) for code in request["evals"])
+                    )
+                    if not has_code and not has_evals:
+                        response = {
+                            "stdout": "",
+                            "stderr": "",
+                            "error": "Bad request: expected {'code': <str>} or {'evals': [<str>, ...]}",
+                        }
+                    elif has_code and not request.get("capture", True):
+                        with lock:
+                            response = execute_silent(request["code"], namespace)
+                    elif has_evals:
+                        # Batch form: N snippets in one round-trip, one
+                        # result dict each, run back-to-back under the lock.
+                        with lock:
+                            results = []
+                            for code in request["evals"]:
+                                results.append(execute(code, namespace, counter[0]))
+                                counter[0] += 1
+                        response = {"results": results}
+                    else:
+                        with lock:
+                            response = execute(request["code"], namespace, counter[0])
+                            counter[0] += 1
             else:
-                response = {"stdout": "", "stderr": "", "error": "Bad request: missing 'code', 'set', or 'get'"}
+                response = {"stdout": "", "stderr": "", "error": f"Bad request: unknown opcode {opcode}"}
 
-        conn.sendall(json.dumps(response).encode() + b"\n")
+            _protocol.send_json(conn, _protocol.RESP_JSON, response)
 
 
-def load_init_namespace() -> dict:
-    import cloudpickle
+def load_pickle_file(path: str):
+    """Unpickle a pack_pickle stream from a file via mmap, then unlink it.
+
+    mmap instead of read(): no bulk copy of the pickle into user space,
+    and the OS pages large payloads (dataframes, models) in on demand.
+    Out-of-band buffers become views straight into the mapping.
+    """
+    import mmap
+
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        value = _protocol.unpack_pickle(mm)
+        try:
+            mm.close()
+        except BufferError:
+            # A loaded object still holds a zero-copy view into the
+            # mapping; leave it to be reclaimed with those references.
+            pass
+    finally:
+        os.unlink(path)
+    return value
 
+
+def load_init_namespace() -> dict:
     init_path = os.environ.get("REPL_BOX_INIT")
     if not init_path:
         return {}
+    return load_pickle_file(init_path)
+
+
+def _unlink_quietly(path: str) -> None:
     try:
-        with open(init_path, "rb") as f:
-            namespace = cloudpickle.load(f)
-    finally:
-        os.unlink(init_path)
-    return namespace
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
 
 
 def serve() -> None:
-    if os.path.exists(SOCKET_PATH):
-        os.unlink(SOCKET_PATH)
+    is_file_socket = not SOCKET_PATH.startswith("@")
+    if is_file_socket:
+        _unlink_quietly(SOCKET_PATH)
 
     namespace: dict = load_init_namespace()
     counter: list[int] = [1]
 
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(SOCKET_PATH)
+    sock_type = socket.SOCK_STREAM | getattr(socket, "SOCK_CLOEXEC", 0)
+    server = socket.socket(socket.AF_UNIX, sock_type)
+    server.bind(_protocol.socket_address(SOCKET_PATH))
     server.listen()
 
     def shutdown(sig, frame):
         print(f"\nShutting down ({SOCKET_PATH})", file=sys.stderr)
         server.close()
-        if os.path.exists(SOCKET_PATH):
-            os.unlink(SOCKET_PATH)
+        if is_file_socket:
+            _unlink_quietly(SOCKET_PATH)
         sys.exit(0)
 
     signal.signal(signal.SIGINT, shutdown)
     signal.signal(signal.SIGTERM, shutdown)
 
+    # Tell a waiting start() we're listening (fd passed by the parent).
+    ready_fd = os.environ.get("REPL_BOX_READY_FD")
+    if ready_fd:
+        os.write(int(ready_fd), b"ok")
+        os.close(int(ready_fd))
+
     print(f"repl-box listening on {SOCKET_PATH}", file=sys.stderr)
 
+    lock = threading.Lock()
     while True:
         try:
             conn, _ = server.accept()
         except OSError:
             break
-        handle(conn, namespace, counter)
+        _protocol.configure_socket(conn)
+        threading.Thread(
+            target=handle, args=(conn, namespace, counter, lock), daemon=True
+        ).start()
 
 
 if __name__ == "__main__":
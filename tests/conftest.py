@@ -0,0 +1,28 @@
+"""Shared fixtures.
+
+One server boot serves the whole session — interpreter startup dominates
+test wall-time, so tests isolate state with repl.set() and uniquely named
+variables instead of starting their own servers. Tests that exercise
+start() itself (preloading, restart semantics, In/Out numbering) keep
+dedicated servers.
+"""
+import pandas as pd
+import pytest
+
+import repl_box
+
+
+@pytest.fixture(scope="session")
+def repl():
+    with repl_box.start() as repl:   # default: abstract socket on Linux
+        yield repl
+
+
+@pytest.fixture(scope="session")
+def sample_df():
+    # Built once per session — BlockManager setup isn't free, and the
+    # server gets a pickled copy anyway, so sharing is safe.
+    return pd.DataFrame({
+        "name": ["alice", "bob", "carol"],
+        "score": [85, 92, 78],
+    })
@@ -1,4 +1,6 @@
 # %%
+import os
+
 import repl_box
 
 
@@ -8,6 +10,6 @@ def mul(x, y):
 
 
 # %% EXPECT: 42
-with repl_box.start(socket_path="/tmp/repl-box-e2e.sock", mul=mul) as repl:
+with repl_box.start(socket_path=f"@repl-box-e2e-{os.getpid()}", mul=mul) as repl:
     result = repl.send("mul(6, 7)")
     print(result["stdout"].strip())
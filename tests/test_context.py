@@ -3,7 +3,6 @@ import json
 
 import pytest
 
-import repl_box
 from repl_box.context import Context
 
 from openai.types.responses import (
@@ -18,12 +17,6 @@ from openai.types.responses import (
 # Fixtures
 # ---------------------------------------------------------------------------
 
-@pytest.fixture
-def repl():
-    with repl_box.start(socket_path="/tmp/repl-box-context-test.sock") as r:
-        yield r
-
-
 @pytest.fixture
 def reasoning_item():
     return ResponseReasoningItem(
@@ -80,6 +73,61 @@ def test_basic_list_operations(repl):
     assert "assistant: hi" in ctx
 
 
+def test_append_resyncs_after_server_side_delete(repl):
+    """Appends ship deltas; if the server-side name vanishes, fall back to a full sync."""
+    ctx = repl.context("history")
+    ctx.append("a")
+    assert repl.send("del history")["error"] is None
+
+    ctx.append("b")
+    assert repl.send("len(history)")["stdout"].find("2") != -1
+
+
+def test_mutations_replay_as_deltas(repl):
+    """pop/insert/setitem mirror server-side without re-sending the list."""
+    ctx = repl.context("history", ["a", "b", "c"])
+
+    ctx.insert(1, "x")
+    ctx[0] = "z"
+    ctx.pop()
+    ctx.remove("x")
+    assert ctx == ["z", "b"]
+    assert repl.get("history") == ["z", "b"]
+
+
+def test_batch_coalesces_syncs(repl, monkeypatch):
+    ctx = repl.context("history")
+
+    calls = []
+    real_set = repl.set
+
+    def counting_set(**variables):
+        calls.append(variables)
+        real_set(**variables)
+
+    monkeypatch.setattr(repl, "set", counting_set)
+
+    with ctx.batch():
+        for i in range(5):
+            ctx.append(f"msg {i}")
+
+    assert len(calls) == 1   # one sync at block exit, not one per append
+    assert len(ctx) == 5
+    assert repl.send("len(history)")["stdout"].find("5") != -1
+
+
+def test_batch_nests(repl):
+    ctx = repl.context("history")
+
+    with ctx.batch():
+        ctx.append("outer")
+        with ctx.batch():
+            ctx.append("inner")
+        ctx.append("outer again")
+
+    assert repl.send("len(history)")["stdout"].find("3") != -1
+
+
 def test_json_serializable(repl):
     ctx = repl.context("history")
     ctx.append({"role": "user", "content": "hello"})
@@ -98,6 +146,18 @@ def test_is_list_subclass(repl):
 # Pydantic coercion
 # ---------------------------------------------------------------------------
 
+def _is_json_safe(value) -> bool:
+    """Structural serializability check — cheaper than an actual json.dumps.
+
+    test_json_serializable remains the canonical dumps contract test.
+    """
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _is_json_safe(v) for k, v in value.items())
+    if isinstance(value, list):
+        return all(_is_json_safe(v) for v in value)
+    return isinstance(value, (str, int, float, bool, type(None)))
+
+
 def test_coerces_reasoning_item(repl, reasoning_item):
     ctx = repl.context("inputs")
     ctx.append(reasoning_item)
@@ -110,7 +170,7 @@ def test_coerces_reasoning_item(repl, reasoning_item):
     assert "status" not in ctx[0]
     assert "content" not in ctx[0]
     assert "encrypted_content" not in ctx[0]
-    assert json.dumps(ctx) is not None
+    assert _is_json_safe(ctx)
 
 
 def test_coerces_tool_call(repl, tool_call):
@@ -121,7 +181,7 @@ def test_coerces_tool_call(repl, tool_call):
     assert ctx[0]["name"] == "patent_search"
     assert ctx[0]["call_id"] == "call_abc123"
     assert ctx[0]["arguments"] == '{"keywords": "electric vehicle battery"}'
-    assert json.dumps(ctx) is not None
+    assert _is_json_safe(ctx)
 
 
 def test_coerces_output_message(repl, output_message):
@@ -131,7 +191,7 @@ def test_coerces_output_message(repl, output_message):
     assert isinstance(ctx[0], dict)
     assert ctx[0]["role"] == "assistant"
     assert ctx[0]["type"] == "message"
-    assert json.dumps(ctx) is not None
+    assert _is_json_safe(ctx)
 
 
 def test_extend_coerces(repl, reasoning_item, tool_call):
@@ -153,7 +213,7 @@ def test_iadd_coerces(repl, reasoning_item, tool_call, output_message):
 
     assert len(ctx) == 5
     assert all(isinstance(item, dict) for item in ctx)
-    assert json.dumps(ctx) is not None
+    assert _is_json_safe(ctx)
 
 
 def test_setitem_coerces(repl, tool_call):
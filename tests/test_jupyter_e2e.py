@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import importlib.util
 import re
 import time
 from dataclasses import dataclass
@@ -10,12 +11,6 @@ from pathlib import Path
 import pytest
 
 
-try:
-    from jupyter_client import KernelManager  # type: ignore[import-not-found]
-except Exception:  # pragma: no cover - optional dependency
-    KernelManager = None
-
-
 CELL_DIR = Path(__file__).parent / "resources" / "jupyter_cells"
 
 
@@ -27,6 +22,12 @@ class Cell:
     expect_err: list[str]
 
 
+# One regex pass locates every cell header; bodies are slices between
+# header offsets — no per-line Python loop over the file contents.
+_HEADER_RE = re.compile(r"(?m)^[ \t]*# %%(.*)\n?")
+_EXPECT_RE = re.compile(r"(EXPECT-RE|EXPECT-ERR|EXPECT):\s*(.*)")
+
+
 def _parse_cell_files() -> list[Cell]:
     cells: list[Cell] = []
     if not CELL_DIR.exists():
@@ -34,16 +35,30 @@ def _parse_cell_files() -> list[Cell]:
 
     for path in sorted(CELL_DIR.glob("*.py")):
         text = path.read_text(encoding="utf-8")
-        current_lines: list[str] = []
+        headers = list(_HEADER_RE.finditer(text))
+        boundaries = [m.start() for m in headers] + [len(text)]
+
+        # Each segment is (header suffix, body up to the next header); text
+        # before the first header forms a cell with no expectations.
+        segments = [(None, text[: boundaries[0]])]
+        segments += [
+            (m.group(1).strip(), text[m.end() : boundaries[i + 1]])
+            for i, m in enumerate(headers)
+        ]
+
         expect_text: list[str] = []
         expect_regex: list[str] = []
         expect_err: list[str] = []
-
-        def flush() -> None:
-            nonlocal current_lines, expect_text, expect_regex, expect_err
-            if not current_lines:
-                return
-            source = "".join(current_lines).strip("\n")
+        buckets = {"EXPECT": expect_text, "EXPECT-RE": expect_regex, "EXPECT-ERR": expect_err}
+
+        for header, body in segments:
+            if header:
+                expect = _EXPECT_RE.match(header)
+                if expect:
+                    buckets[expect.group(1)].append(expect.group(2).strip())
+            if not body:
+                continue  # consecutive headers: expectations accumulate
+            source = body.strip("\n")
             if source:
                 cells.append(
                     Cell(
@@ -53,26 +68,8 @@ def _parse_cell_files() -> list[Cell]:
                         expect_err=expect_err,
                     )
                 )
-            current_lines = []
-            expect_text = []
-            expect_regex = []
-            expect_err = []
-
-        for line in text.splitlines(keepends=True):
-            stripped = line.strip()
-            if stripped.startswith("# %%"):
-                flush()
-                header = stripped[len("# %%") :].strip()
-                if header.startswith("EXPECT:"):
-                    expect_text.append(header[len("EXPECT:") :].strip())
-                elif header.startswith("EXPECT-RE:"):
-                    expect_regex.append(header[len("EXPECT-RE:") :].strip())
-                elif header.startswith("EXPECT-ERR:"):
-                    expect_err.append(header[len("EXPECT-ERR:") :].strip())
-                continue
-            current_lines.append(line)
-
-        flush()
+            expect_text, expect_regex, expect_err = [], [], []
+            buckets = {"EXPECT": expect_text, "EXPECT-RE": expect_regex, "EXPECT-ERR": expect_err}
 
     return cells
 
@@ -97,39 +94,51 @@ def _capture_execute_result(msgs: list[dict]) -> str:
     return "".join(output)
 
 
-def _collect_iopub_msgs(kc, msg_id: str, timeout: float) -> list[dict]:
-    msgs: list[dict] = []
-    deadline = time.monotonic() + timeout
-    while True:
-        remaining = deadline - time.monotonic()
-        if remaining <= 0:
-            raise TimeoutError("timed out waiting for iopub messages")
-        msg = kc.get_iopub_msg(timeout=remaining)
-        if msg.get("parent_header", {}).get("msg_id") != msg_id:
-            continue
-        msgs.append(msg)
-        if (
-            msg.get("msg_type") == "status"
-            and msg.get("content", {}).get("execution_state") == "idle"
-        ):
-            return msgs
+def _drain(kc, msg_id: str, timeout: float) -> list[dict]:
+    """Collect iopub output for msg_id until idle AND the execute_reply arrive.
+
+    Polls the shell and iopub sockets together rather than blocking on
+    each channel in turn, so the reply is consumed in whichever order the
+    kernel sends it.
+    """
+    import zmq
 
+    msgs: list[dict] = []
+    got_idle = False
+    got_reply = False
+    poller = zmq.Poller()
+    poller.register(kc.iopub_channel.socket, zmq.POLLIN)
+    poller.register(kc.shell_channel.socket, zmq.POLLIN)
 
-def _wait_for_execute_reply(kc, msg_id: str, timeout: float) -> None:
     deadline = time.monotonic() + timeout
-    while True:
+    while not (got_idle and got_reply):
         remaining = deadline - time.monotonic()
         if remaining <= 0:
-            raise TimeoutError("timed out waiting for execute_reply")
-        msg = kc.get_shell_msg(timeout=remaining)
-        if msg.get("parent_header", {}).get("msg_id") == msg_id:
-            return
+            raise TimeoutError("timed out waiting for kernel messages")
+        ready = dict(poller.poll(remaining * 1000))
+        if kc.iopub_channel.socket in ready:
+            msg = kc.get_iopub_msg(timeout=0)
+            if msg.get("parent_header", {}).get("msg_id") == msg_id:
+                msgs.append(msg)
+                if (
+                    msg.get("msg_type") == "status"
+                    and msg.get("content", {}).get("execution_state") == "idle"
+                ):
+                    got_idle = True
+        if kc.shell_channel.socket in ready:
+            msg = kc.get_shell_msg(timeout=0)
+            if msg.get("parent_header", {}).get("msg_id") == msg_id:
+                got_reply = True
+    return msgs
 
 
 @pytest.mark.integration
 def test_jupyter_cell_files():
-    if KernelManager is None:
+    # Imported here, not at module top: jupyter_client drags in ipykernel,
+    # tornado, and zmq, which collection-only and unit runs shouldn't pay for.
+    if importlib.util.find_spec("jupyter_client") is None:
         pytest.skip("jupyter_client not installed")
+    from jupyter_client import KernelManager  # type: ignore[import-not-found]
 
     cells = _parse_cell_files()
     if not cells:
@@ -145,8 +154,7 @@ def test_jupyter_cell_files():
 
         for index, cell in enumerate(cells, start=1):
             msg_id = kc.execute(cell.source)
-            msgs = _collect_iopub_msgs(kc, msg_id, timeout=30)
-            _wait_for_execute_reply(kc, msg_id, timeout=30)
+            msgs = _drain(kc, msg_id, timeout=30)
             stdout = _capture_stream(msgs, "stdout")
             stderr = _capture_stream(msgs, "stderr")
             execute_result = _capture_execute_result(msgs)
@@ -17,7 +17,7 @@ import cloudpickle
 import pytest
 
 import repl_box
-from repl_box._notebook import clean_for_notebook, _is_notebook_global
+from repl_box._notebook import clean_for_notebook, _is_notebook_global, _probe_picklable
 
 from IPython.core.interactiveshell import InteractiveShell
 
@@ -27,6 +27,17 @@ def shell():
     return InteractiveShell.instance()
 
 
+def _define(shell, src: str) -> None:
+    """Define code in the shell's namespace without IPython's input machinery.
+
+    run_cell runs the full input-transformer stack (magic detection,
+    autocall, history) per call; a plain exec against user_ns gives the
+    same notebook-style globals for a fraction of the cost. One test
+    keeps run_cell to cover real IPython semantics.
+    """
+    exec(compile(src, "<nb>", "exec"), shell.user_ns)
+
+
 # ---------------------------------------------------------------------------
 # _is_notebook_global — unit tests
 # ---------------------------------------------------------------------------
@@ -53,6 +64,26 @@ def test_passes_normal_globals():
     assert not _is_notebook_global('Patent', object)
 
 
+def test_unsafe_module_match_is_exact():
+    """The denylist matches whole module names, not bare string prefixes:
+    a type from 'socket_utils' must not be dropped just because its
+    module starts with 'socket'."""
+    class FromSocketUtils:
+        pass
+    FromSocketUtils.__module__ = 'socket_utils'
+    assert _probe_picklable(FromSocketUtils(), {})
+
+    class FromSocket:
+        pass
+    FromSocket.__module__ = 'socket'
+    assert not _probe_picklable(FromSocket(), {})
+
+    class FromSocketSub:
+        pass
+    FromSocketSub.__module__ = 'socket.something'
+    assert not _probe_picklable(FromSocketSub(), {})
+
+
 # ---------------------------------------------------------------------------
 # clean_for_notebook
 # ---------------------------------------------------------------------------
@@ -82,7 +113,7 @@ def test_strips_ipython_globals(shell):
 def test_ipython_globals_unpicklable(shell):
     """A function referencing get_ipython fails to pickle (sqlite3.Connection
     is in its object graph). This is analogous to ZMQ sockets in Jupyter."""
-    shell.run_cell("def fn_refs_ipython(x):\n    ip = get_ipython()\n    return x")
+    _define(shell, "def fn_refs_ipython(x):\n    ip = get_ipython()\n    return x")
     fn = shell.user_ns['fn_refs_ipython']
 
     with pytest.raises(Exception, match="sqlite3"):
@@ -98,7 +129,7 @@ def test_clean_for_notebook_fixes_unpicklable_globals(shell):
     functions passed to repl-box only share globals with get_ipython; they
     don't call it directly.
     """
-    shell.run_cell("def fn_to_clean(x):\n    ip = get_ipython()\n    return x * 3")
+    _define(shell, "def fn_to_clean(x):\n    ip = get_ipython()\n    return x * 3")
     fn = shell.user_ns['fn_to_clean']
 
     with pytest.raises(Exception):
@@ -111,7 +142,7 @@ def test_clean_for_notebook_fixes_unpicklable_globals(shell):
 
 def test_function_works_after_cleaning(shell):
     """A clean function with no bad globals still runs correctly."""
-    shell.run_cell("def greet(name):\n    return f'hello {name}'")
+    _define(shell, "def greet(name):\n    return f'hello {name}'")
     fn = shell.user_ns['greet']
 
     cleaned = clean_for_notebook(fn)
@@ -126,10 +157,10 @@ def test_function_works_after_cleaning(shell):
 
 def test_start_with_notebook_function(shell):
     """start() succeeds for a function defined in an IPython shell."""
-    shell.run_cell("def score(x):\n    return x * 10")
+    _define(shell, "def score(x):\n    return x * 10")
     fn = shell.user_ns['score']
 
-    with repl_box.start(socket_path="/tmp/repl-box-nb-start-test.sock", score=fn) as repl:
+    with repl_box.start(score=fn) as repl:
         result = repl.send("score(5)")
         assert "50" in result["stdout"]
         assert result["error"] is None
@@ -137,10 +168,10 @@ def test_start_with_notebook_function(shell):
 
 def test_set_with_notebook_function(shell):
     """repl.set() succeeds for a function defined in an IPython shell."""
-    shell.run_cell("def double(x):\n    return x * 2")
+    _define(shell, "def double(x):\n    return x * 2")
     fn = shell.user_ns['double']
 
-    with repl_box.start(socket_path="/tmp/repl-box-nb-set-test.sock") as repl:
+    with repl_box.start() as repl:
         repl.set(double=fn)
         result = repl.send("double(21)")
         assert "42" in result["stdout"]
@@ -149,7 +180,8 @@ def test_set_with_notebook_function(shell):
 
 def test_cross_function_reference(shell):
     """A notebook function that calls another notebook function works after cleaning."""
-    shell.run_cell(
+    _define(
+        shell,
         "def helper(x):\n    return x * 2\n"
         "def main_fn(x):\n    return helper(x) + 1\n"
     )
@@ -161,12 +193,13 @@ def test_cross_function_reference(shell):
 
 def test_start_cross_function(shell):
     """End-to-end: notebook function calling a helper works in the server."""
-    shell.run_cell(
+    _define(
+        shell,
         "def _double(x):\n    return x * 2\n"
         "def compute(x):\n    return _double(x) + 3\n"
     )
     fn = shell.user_ns['compute']
-    with repl_box.start(socket_path="/tmp/repl-box-nb-cross-test.sock", compute=fn) as repl:
+    with repl_box.start(compute=fn) as repl:
         result = repl.send("compute(7)")
         assert "17" in result["stdout"]   # _double(7)=14, +3=17
         assert result["error"] is None
@@ -178,7 +211,8 @@ def test_notebook_function_with_pydantic(shell):
     Both the model class and the function are defined in the IPython shell so
     Patent is naturally in the shared globals — no manual injection needed.
     """
-    shell.run_cell(
+    _define(
+        shell,
         "from pydantic import BaseModel\n"
         "class Patent(BaseModel):\n"
         "    title: str\n"
@@ -188,8 +222,7 @@ def test_notebook_function_with_pydantic(shell):
     )
     fn = shell.user_ns['find_patent']
 
-    with repl_box.start(socket_path="/tmp/repl-box-nb-pydantic-test.sock",
-                        find_patent=fn) as repl:
+    with repl_box.start(find_patent=fn) as repl:
         r = repl.send("result = find_patent('EV battery')")
         assert r["error"] is None, f"find_patent failed: {r['error']}"
         assert "Alice" in repl.send("result.inventor")["stdout"]
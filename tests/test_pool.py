@@ -0,0 +1,35 @@
+"""Tests for repl_box.pool() — pre-started servers handed out by start()."""
+import repl_box
+
+
+def test_pool_reuses_server():
+    with repl_box.pool(size=1) as pool:
+        with pool.start(x=1) as repl:
+            repl.send("import os; pid = os.getpid()")
+            first_pid = repl.get("pid")
+
+        with pool.start(y=2) as repl:
+            repl.send("import os; pid = os.getpid()")
+            assert repl.get("pid") == first_pid   # same process, no respawn
+
+
+def test_pool_resets_namespace():
+    with repl_box.pool(size=1) as pool:
+        with pool.start(x=1) as repl:
+            assert repl.send("x")["error"] is None
+
+        with pool.start() as repl:
+            assert repl.send("x")["error"] is not None   # previous state cleared
+
+
+def test_pool_overflow_starts_fresh_server():
+    with repl_box.pool(size=1) as pool:
+        first = pool.start()
+        second = pool.start()   # pool exhausted — fresh unpooled server
+        try:
+            first.send("import os; pid = os.getpid()")
+            second.send("import os; pid = os.getpid()")
+            assert first.get("pid") != second.get("pid")
+        finally:
+            second.close()
+            first.close()